@@ -1,14 +1,25 @@
 import logging
 import logging.config
+import asyncio
+import hashlib
+import math
+import re
+import sys
 import uvicorn
-import requests
-from typing import List, Dict, Any
+import httpx
+import msgspec
+import orjson
+from cachetools import TTLCache
+from contextlib import asynccontextmanager
+from operator import attrgetter
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional, Tuple
 
 # MCP imports
 from mcp.server.fastmcp import FastMCP
 from starlette.applications import Starlette
 from starlette.routing import Mount, Route
-from starlette.responses import JSONResponse
+from starlette.responses import Response
 from starlette.endpoints import HTTPEndpoint
 
 # Import configuration
@@ -23,10 +34,256 @@ if settings.MCP_DEBUG:
     logger.setLevel(logging.DEBUG)
     logger.debug("DEBUG mode activated")
 
-def log(message: str, level: str = "info"):
-    """Helper function for consistent logging."""
-    log_func = getattr(logger, level.lower(), logger.info)
-    log_func(message)
+# Azure Retail Prices API configuration
+AZURE_PRICE_API = settings.AZURE_RETAIL_PRICES_URL
+API_VERSION = settings.AZURE_API_VERSION
+BASE_PARAMS = {'api-version': API_VERSION}
+
+# Retry policy for transient Azure API errors
+MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# Longest Retry-After (seconds) worth waiting for inside a tool call; longer ones return the error
+MAX_RETRY_DELAY = 10.0
+
+# Shared HTTP client for the Azure Retail Prices API (created on application startup)
+http_client: Optional[httpx.AsyncClient] = None
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the async HTTP client used to query the Azure Retail Prices API."""
+    return httpx.AsyncClient(
+        timeout=30,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        # Retries failed connection attempts; status-based retries are handled in azure_get
+        transport=httpx.AsyncHTTPTransport(retries=MAX_RETRIES),
+        headers={
+            # Pricing JSON is very repetitive and compresses 5-10x
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive"
+        }
+    )
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it if the application lifespan has not run."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = create_http_client()
+    return http_client
+
+async def azure_get(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+    """
+    GET a URL from the Azure Retail Prices API using the shared connection pool.
+    
+    Responses with a transient status code (429, 5xx) are retried with exponential
+    backoff, honouring the Retry-After header when the API sends one. If the API asks
+    to wait longer than MAX_RETRY_DELAY, the error response is returned instead.
+    """
+    client = get_http_client()
+    for attempt in range(MAX_RETRIES + 1):
+        response = await client.get(url, params=params, headers=headers)
+        if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+            return response
+        
+        retry_after = response.headers.get("Retry-After", "")
+        delay = float(retry_after) if retry_after.isdigit() else RETRY_BACKOFF_FACTOR * (2 ** attempt)
+        if delay > MAX_RETRY_DELAY:
+            logger.warning(f"Azure API returned {response.status_code} with Retry-After {delay:.0f}s, not retrying")
+            return response
+        logger.warning(f"Azure API returned {response.status_code}, retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_RETRIES})")
+        await asyncio.sleep(delay)
+
+def odata_filter(**fields: str) -> str:
+    """
+    Build an OData $filter expression matching every non-empty field.
+    
+    Single quotes in values are escaped by doubling them, as required by OData,
+    so names such as "Men's Product" do not break the query.
+    """
+    clauses = []
+    for field, value in fields.items():
+        if value:
+            escaped = value.replace("'", "''")
+            clauses.append(f"{field} eq '{escaped}'")
+    return " and ".join(clauses)
+
+class ResponseCache:
+    """
+    In-process TTL cache for decoded Azure API responses.
+    
+    Retail prices change slowly, so repeated queries within the TTL are served
+    without going to the network. Any object with the same get/set interface
+    (e.g. one backed by Redis) can be assigned to response_cache instead.
+    """
+    def __init__(self, maxsize: int, ttl: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired."""
+        value = self._cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+    
+    def set(self, key, value):
+        """Store value under key until the TTL expires."""
+        self._cache[key] = value
+
+response_cache = ResponseCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+
+# ETag/Last-Modified validators of past responses, kept after the TTL expires so that
+# stale entries can be revalidated with a conditional GET: (etag, last_modified, result).
+# Stale results are also dropped after STALE_TTL_FACTOR times the response TTL, so memory
+# stays bounded in time and not only in the number of entries.
+STALE_TTL_FACTOR = 12
+validator_cache = TTLCache(maxsize=settings.CACHE_MAX_ENTRIES, ttl=settings.CACHE_TTL_SECONDS * STALE_TTL_FACTOR)
+
+async def cached_get(url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Return the decoded JSON for an Azure API request, using response_cache.
+    
+    The cache key is the URL plus the query parameters in canonical (sorted) order.
+    Expired entries are revalidated with If-None-Match/If-Modified-Since, so an
+    unchanged page costs a 304 response instead of a new download and parse.
+    Raises httpx.HTTPStatusError if the API answers with an error status.
+    """
+    key = (url, tuple(sorted(params.items())) if params else ())
+    result = response_cache.get(key)
+    if result is not None:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Cache hit ({response_cache.hits} hits, {response_cache.misses} misses): {url} {params or ''}")
+        return result
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Cache miss ({response_cache.hits} hits, {response_cache.misses} misses): {url} {params or ''}")
+    
+    # Revalidate an expired response using the validators the API sent with it
+    headers = {}
+    stale = validator_cache.get(key)
+    if stale is not None:
+        etag, last_modified, stale_result = stale
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    
+    response = await azure_get(url, params=params, headers=headers)
+    if response.status_code == 304 and stale is not None:
+        logger.debug("Response not modified, reusing the previous result")
+        result = stale_result
+    else:
+        response.raise_for_status()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Response of {len(response.content)} bytes, content-encoding: {response.headers.get('content-encoding', 'identity')}")
+        result = orjson.loads(response.content)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            validator_cache[key] = (etag, last_modified, result)
+    
+    response_cache.set(key, result)
+    return result
+
+async def fetch_items(filter_params: str, top: int = 1000, max_pages: int = 3) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Fetch the price items matching an OData filter, following NextPageLink.
+    
+    The first page asks for `top` items (1000 is the API maximum) and at most
+    `max_pages` pages are read. Each following page is downloaded in the background
+    while the current one is processed.
+    
+    Returns:
+        tuple: The list of items and whether all pages were read
+    """
+    def prefetch_page(next_page_link, page_count):
+        """Start downloading the next page in the background, if there is one to get."""
+        if not next_page_link or page_count >= max_pages:
+            return None
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Getting additional page {page_count + 1}: {next_page_link}")
+        return asyncio.create_task(cached_get(next_page_link))
+    
+    # Make the request to the Azure API
+    logger.info(f"Querying API with filter: {filter_params}")
+    params = {
+        **BASE_PARAMS,
+        '$filter': filter_params,
+        '$top': top
+    }
+    result = await cached_get(AZURE_PRICE_API, params=params)
+    
+    # Request the next page before processing this one so both overlap
+    page_count = 1
+    next_page_link = result.get("NextPageLink")
+    next_page = prefetch_page(next_page_link, page_count)
+    items = list(result.get("Items", []))  # Copy, the page may be shared with the response cache
+    
+    # Continue getting more pages while there is a NextPageLink
+    while next_page is not None:
+        try:
+            next_result = await next_page
+        except Exception as e:
+            logger.error(f"Error getting additional page: {str(e)}")
+            break
+        
+        # Queue the following page before adding the items of this one
+        page_count += 1
+        next_page_link = next_result.get("NextPageLink")
+        next_page = prefetch_page(next_page_link, page_count)
+        items.extend(next_result.get("Items", []))
+    
+    logger.info(f"Retrieved {len(items)} items across {page_count} pages")
+    return items, next_page_link is None
+
+class CostRow(msgspec.Struct):
+    """Monthly cost of a single price item, as returned by get_monthly_cost."""
+    sku_name: str
+    meter_name: str
+    retail_price: float
+    unit_of_measure: str
+    monthly_cost: float
+    currency: str
+
+# Official list of service families according to Microsoft documentation
+SERVICE_FAMILIES = (
+    "Analytics",
+    "Azure Arc",
+    "Azure Communication Services",
+    "Azure Security",
+    "Azure Stack",
+    "Compute",
+    "Containers",
+    "Data",
+    "Databases",
+    "Developer Tools",
+    "Dynamics",
+    "Gaming",
+    "Integration",
+    "Internet of Things",
+    "Management and Governance",
+    "Microsoft Syntex",
+    "Mixed Reality",
+    "Networking",
+    "Other",
+    "Power Platform",
+    "Quantum Computing",
+    "Security",
+    "Storage",
+    "Telecommunications",
+    "Web",
+    "Windows Virtual Desktop"
+)
+
+# The list is static, so the list_service_families response is built once at import time
+SERVICE_FAMILIES_RESPONSE = MappingProxyType({
+    "service_families": SERVICE_FAMILIES,
+    "count": len(SERVICE_FAMILIES),
+    "source": "official_documentation",
+    "reference": "https://learn.microsoft.com/en-us/rest/api/cost-management/retail-prices/azure-retail-prices#supported-servicefamily-values"
+})
 
 # Create MCP server
 mcp = FastMCP("Azure Pricing MCP")
@@ -48,44 +305,9 @@ mcp = FastMCP("Azure Pricing MCP")
     Returns:
         dict: Dictionary with the list of service families and the total number of items
     """)
-def list_service_families():
-    # Official list of service families according to Microsoft documentation
-    official_service_families = [
-        "Analytics",
-        "Azure Arc",
-        "Azure Communication Services",
-        "Azure Security",
-        "Azure Stack",
-        "Compute",
-        "Containers",
-        "Data",
-        "Databases",
-        "Developer Tools",
-        "Dynamics",
-        "Gaming",
-        "Integration",
-        "Internet of Things",
-        "Management and Governance",
-        "Microsoft Syntex",
-        "Mixed Reality",
-        "Networking",
-        "Other",
-        "Power Platform",
-        "Quantum Computing",
-        "Security",
-        "Storage",
-        "Telecommunications",
-        "Web",
-        "Windows Virtual Desktop"
-    ]
-    
-    log("Returning official list of Azure service families")
-    return {
-        "service_families": official_service_families,
-        "count": len(official_service_families),
-        "source": "official_documentation",
-        "reference": "https://learn.microsoft.com/en-us/rest/api/cost-management/retail-prices/azure-retail-prices#supported-servicefamily-values"
-    }
+async def list_service_families():
+    logger.info("Returning official list of Azure service families")
+    return dict(SERVICE_FAMILIES_RESPONSE)
 
 @mcp.tool(description="""
     [STEP 3] Get product names from a specific service family.
@@ -107,7 +329,7 @@ def list_service_families():
         product_name_contains (str, optional): Filter products whose name contains this text (e.g. 'Redis', 'SQL')
         limit (int, optional): Maximum number of products to return (default: 0, which means no limit)
     """)
-def get_products(service_family, region="westeurope", type="", service_name="", product_name_contains="", limit=0):
+async def get_products(service_family, region="westeurope", type="", service_name="", product_name_contains="", limit=0):
     # Ensure parameters are of the correct type
     service_family = str(service_family)
     region = str(region)
@@ -123,40 +345,18 @@ def get_products(service_family, region="westeurope", type="", service_name="",
         log_message += f", filtered by products containing '{product_name_contains}'"
     if limit > 0:
         log_message += f", limited to {limit} results"
-    log(log_message)
-    
-    # API Configuration
-    AZURE_PRICE_API = "https://prices.azure.com/api/retail/prices"
-    API_VERSION = "2023-01-01-preview"
+    logger.info(log_message)
     
     # Build query parameters
-    filter_params = f"serviceFamily eq '{service_family}'"
-    if region:
-        filter_params += f" and armRegionName eq '{region}'"
-    if type:
-        filter_params += f" and type eq '{type}'"
-    if service_name:
-        filter_params += f" and serviceName eq '{service_name}'"
-    
-    params = {
-        'api-version': API_VERSION,
-        '$filter': filter_params
-    }
-    
-    # We don't set a limit to get all available results
-    # The API can automatically paginate if there are many results
+    filter_params = odata_filter(serviceFamily=service_family, armRegionName=region, type=type, serviceName=service_name)
     
     try:
-        # Make the request to the Azure API
-        log(f"Querying API with filter: {filter_params}")
-        response = requests.get(AZURE_PRICE_API, params=params)
-        response.raise_for_status()
-        result = response.json()
+        # Get all available results, following the API pagination
+        all_items, _ = await fetch_items(filter_params)
         
         # Check if the response is empty
-        items = result.get("Items", [])
-        if len(items) == 0:
-            log(f"No products found for the specified criteria: {filter_params}", "warning")
+        if len(all_items) == 0:
+            logger.warning(f"No products found for the specified criteria: {filter_params}")
             return {
                 "product_names": [],
                 "count": 0,
@@ -170,52 +370,28 @@ def get_products(service_family, region="westeurope", type="", service_name="",
                 "product_name_filter": product_name_contains if product_name_contains else None
             }
         
-        # Check if there are more pages
-        next_page_link = result.get("NextPageLink")
-        all_items = items
-        page_count = 1
-        max_pages = 3  # Reasonable page limit to avoid too many calls
-        
-        # Continue getting more pages if there is a NextPageLink
-        while next_page_link and page_count < max_pages:
-            log(f"Getting additional page {page_count + 1}: {next_page_link}")
-            try:
-                next_response = requests.get(next_page_link)
-                next_response.raise_for_status()
-                next_result = next_response.json()
-                
-                # Add items from the next page
-                next_items = next_result.get("Items", [])
-                all_items.extend(next_items)
-                
-                # Update for the next iteration
-                next_page_link = next_result.get("NextPageLink")
-                page_count += 1
-            except Exception as e:
-                log(f"Error getting additional page: {str(e)}", "error")
-                break
-        
         # Filter by product name if specified
         if product_name_contains:
-            filtered_items = [item for item in all_items if product_name_contains.lower() in item.get("productName", "").lower()]
-            log(f"Filtering: from {len(all_items)} products, {len(filtered_items)} contain '{product_name_contains}'")
+            # Case-insensitive substring match without lowercasing every product name
+            pattern = re.compile(re.escape(product_name_contains), re.IGNORECASE)
+            filtered_items = [item for item in all_items if (name := item.get("productName")) and pattern.search(name)]
+            logger.info(f"Filtering: from {len(all_items)} products, {len(filtered_items)} contain '{product_name_contains}'")
             all_items = filtered_items
         
-        # Extract product names
-        product_names = list(set(item.get("productName", "") for item in all_items if item.get("productName")))
-        product_names.sort()  # Sort alphabetically
+        # Extract unique product names, sorted alphabetically
+        product_names = sorted({name for item in all_items if (name := item.get("productName"))})
         
         # Limit results if specified
         if limit > 0 and len(product_names) > limit:
             limited_product_names = product_names[:limit]
-            log(f"Limiting results: showing {len(limited_product_names)} of {len(product_names)} total products")
+            logger.info(f"Limiting results: showing {len(limited_product_names)} of {len(product_names)} total products")
             was_limited = True
         else:
             limited_product_names = product_names
             was_limited = False
         
         # Return product names
-        log(f"Retrieved {len(limited_product_names)} unique product names from {len(all_items)} total products across {page_count} pages")
+        logger.info(f"Retrieved {len(limited_product_names)} unique product names from {len(all_items)} total products")
         return {
             "product_names": limited_product_names,
             "count": len(limited_product_names),
@@ -228,8 +404,8 @@ def get_products(service_family, region="westeurope", type="", service_name="",
             "product_name_filter": product_name_contains if product_name_contains else None
         }
         
-    except requests.exceptions.RequestException as e:
-        log(f"Error connecting to Azure API: {str(e)}", "error")
+    except httpx.HTTPError as e:
+        logger.error(f"Error connecting to Azure API: {str(e)}")
         return {
             "error": f"Error connecting to API: {str(e)}",
             "status": "error"
@@ -253,44 +429,27 @@ def get_products(service_family, region="westeurope", type="", service_name="",
         region (str): Azure region (default: 'westeurope')
         max_results (int): Maximum number of results to process (for 'Compute')
     """)
-def get_service_names(service_family, region="westeurope", max_results=500):
+async def get_service_names(service_family, region="westeurope", max_results=500):
     # Ensure parameters are of the correct type
     service_family = str(service_family)
     region = str(region)
     max_results = int(max_results)
     
-    log(f"Getting unique service names for family {service_family} in region {region}")
+    logger.info(f"Getting unique service names for family {service_family} in region {region}")
     
     # Special handling for 'Compute' which has many results
     if service_family.lower() == "compute":
-        log(f"Using optimized approach for Compute family, limiting to {max_results} results")
+        logger.info(f"Using optimized approach for Compute family, limiting to {max_results} results")
         
-        # API Configuration
-        AZURE_PRICE_API = "https://prices.azure.com/api/retail/prices"
-        API_VERSION = "2023-01-01-preview"
-        
-        # Build query parameters with a specific top to optimize
-        filter_params = f"serviceFamily eq '{service_family}'"
-        if region:
-            filter_params += f" and armRegionName eq '{region}'"
-        
-        params = {
-            'api-version': API_VERSION,
-            '$filter': filter_params,
-            '$top': min(int(max_results), 1000)  # Maximum 1000 allowed by the API
-        }
+        # Build query parameters, reading a single page with a specific top to optimize
+        filter_params = odata_filter(serviceFamily=service_family, armRegionName=region)
         
         try:
-            # Make the request to the Azure API
-            log(f"Querying API with optimized filter: {filter_params}")
-            response = requests.get(AZURE_PRICE_API, params=params)
-            response.raise_for_status()
-            result = response.json()
+            items, _ = await fetch_items(filter_params, top=min(max_results, 1000), max_pages=1)  # Maximum 1000 allowed by the API
             
             # Check if the response is empty
-            items = result.get("Items", [])
             if len(items) == 0:
-                log(f"No products found for the specified criteria: {filter_params}", "warning")
+                logger.warning(f"No products found for the specified criteria: {filter_params}")
                 return {
                     "service_family": service_family,
                     "service_names": [],
@@ -301,9 +460,8 @@ def get_service_names(service_family, region="westeurope", max_results=500):
                     "filter_applied": filter_params
                 }
             
-            # Extract unique service names
-            service_names = list(set(item.get("serviceName", "") for item in items if item.get("serviceName")))
-            service_names.sort()  # Sort alphabetically
+            # Extract unique service names, sorted alphabetically
+            service_names = sorted({name for item in items if (name := item.get("serviceName"))})
             
             return {
                 "service_family": service_family,
@@ -314,8 +472,8 @@ def get_service_names(service_family, region="westeurope", max_results=500):
                 "note": f"Optimized results for Compute family, limited to {len(items)} products"
             }
             
-        except requests.exceptions.RequestException as e:
-            log(f"Error connecting to Azure API: {str(e)}", "error")
+        except httpx.HTTPError as e:
+            logger.error(f"Error connecting to Azure API: {str(e)}")
             return {
                 "error": f"Error connecting to API: {str(e)}",
                 "status": "error"
@@ -323,74 +481,37 @@ def get_service_names(service_family, region="westeurope", max_results=500):
     
     # For other families, we get all products and extract service names
     try:
-        # Use existing get_products function
-        products_result = get_products(service_family, region)
+        # Same query as get_products, so the pages are shared through the response cache
+        filter_params = odata_filter(serviceFamily=service_family, armRegionName=region)
+        items, is_complete = await fetch_items(filter_params)
         
-        # Check if response is empty or has an error
-        if products_result.get("status") == "error" or products_result.get("count", 0) == 0:
-            log(f"No products found for family {service_family}", "warning")
+        # Check if the response is empty
+        if len(items) == 0:
+            logger.warning(f"No products found for family {service_family}")
             return {
                 "service_family": service_family,
                 "service_names": [],
                 "count": 0,
                 "is_complete": True,
                 "status": "success",
-                "message": products_result.get("message", f"No products found for family '{service_family}' in region '{region}'."),
-                "filter_applied": products_result.get("filter_applied", "")
+                "message": f"No products found for family '{service_family}' in region '{region}'.",
+                "filter_applied": filter_params
             }
         
-        # Since get_products now returns only product names, we need to make another call
-        # to the API to get the service names.
-        log(f"Querying API to get service names for {service_family}")
-        
-        # API Configuration
-        AZURE_PRICE_API = "https://prices.azure.com/api/retail/prices"
-        API_VERSION = "2023-01-01-preview"
-        
-        # API Configuration
-        filter_params = f"serviceFamily eq '{service_family}'"
-        if region:
-            filter_params += f" and armRegionName eq '{region}'"
-        
-        params = {
-            'api-version': API_VERSION,
-            '$filter': filter_params,
-            '$top': 100  # Limit to 100 results to get a reasonable sample
-        }
-        
-        try:
-            # Make the request to the Azure API
-            log(f"Querying API with filter: {filter_params}")
-            response = requests.get(AZURE_PRICE_API, params=params)
-            response.raise_for_status()
-            result = response.json()
-            
-            # Extract unique service names
-            items = result.get("Items", [])
-            service_names = list(set(item.get("serviceName", "") for item in items if item.get("serviceName")))
-            service_names.sort()  # Sort alphabetically
-        except Exception as e:
-            log(f"Error getting service names: {str(e)}", "error")
-            return {
-                "service_family": service_family,
-                "service_names": [],
-                "count": 0,
-                "is_complete": True,
-                "status": "error",
-                "message": f"Error getting service names: {str(e)}"
-            }
+        # Extract unique service names, sorted alphabetically
+        service_names = sorted({name for item in items if (name := item.get("serviceName"))})
         
         return {
             "service_family": service_family,
             "service_names": service_names,
             "count": len(service_names),
-            "is_complete": products_result.get("NextPageLink") is None,  # Indicate if it's the complete list
+            "is_complete": is_complete,  # Indicate if it's the complete list
             "region": region,
             "processed_items": len(items)
         }
         
     except Exception as e:
-        log(f"Error getting service names: {str(e)}", "error")
+        logger.error(f"Error getting service names: {str(e)}")
         return {
             "error": f"Error getting service names: {str(e)}",
             "status": "error"
@@ -416,38 +537,30 @@ def get_service_names(service_family, region="westeurope", max_results=500):
         monthly_hours (int): Number of hours per month (default: 730, which is approximately one month)
         type (str, optional): Price type (e.g. 'Consumption', 'Reservation')
     """)
-def get_monthly_cost(product_name, region="westeurope", monthly_hours=730, type="Consumption"):
+async def get_monthly_cost(product_name, region="westeurope", monthly_hours=730, type="Consumption"):
     # Ensure parameters are of the correct type
     product_name = str(product_name)
     region = str(region)
     type = str(type)
     monthly_hours = int(monthly_hours) if not isinstance(monthly_hours, int) else monthly_hours
     
-    # API Configuration
-    AZURE_PRICE_API = "https://prices.azure.com/api/retail/prices"
-    API_VERSION = "2023-01-01-preview"
-    
-    filter_params = f"productName eq '{product_name}' and armRegionName eq '{region}'"
-    if type:
-        filter_params += f" and type eq '{type}'"
+    filter_params = odata_filter(productName=product_name, armRegionName=region, type=type)
     
     params = {
-        'api-version': API_VERSION,
+        **BASE_PARAMS,
         '$filter': filter_params,
     }
     
     try:
         # Make the request to the Azure API
-        log(f"Querying API to get the price of {product_name} in {region}")
-        response = requests.get(AZURE_PRICE_API, params=params)
-        response.raise_for_status()
-        result = response.json()
+        logger.info(f"Querying API to get the price of {product_name} in {region}")
+        result = await cached_get(AZURE_PRICE_API, params=params)
         
         # Extract relevant items
         items = result.get("Items", [])
         
         if len(items) == 0:
-            log(f"No products found for: {product_name}", "warning")
+            logger.warning(f"No products found for: {product_name}")
             return {
                 "product_name": product_name,
                 "region": region,
@@ -456,48 +569,36 @@ def get_monthly_cost(product_name, region="westeurope", monthly_hours=730, type=
                 "filter_applied": filter_params
             }
         
-        # Prepare the response with costs
-        products_costs = []
-        total_monthly_cost = 0
-        
-        for item in items:
-            # Extract relevant information
-            sku_name = item.get("skuName", "")
-            meter_name = item.get("meterName", "")
-            retail_price = item.get("retailPrice", 0)
-            currency = item.get("currencyCode", "USD")
-            unit_of_measure = item.get("unitOfMeasure", "")
-            
-            # Calculate monthly cost
-            monthly_cost = retail_price * monthly_hours if "Hour" in unit_of_measure else retail_price
-            total_monthly_cost += monthly_cost
-            
-            # Add to the costs list
-            products_costs.append({
-                "sku_name": sku_name,
-                "meter_name": meter_name,
-                "retail_price": retail_price,
-                "unit_of_measure": unit_of_measure,
-                "monthly_cost": monthly_cost,
-                "currency": currency
-            })
+        # Prepare the response with costs, hourly prices are multiplied by the monthly hours
+        products_costs = [
+            CostRow(
+                sku_name=item.get("skuName", ""),
+                meter_name=item.get("meterName", ""),
+                retail_price=(retail_price := item.get("retailPrice", 0)),
+                unit_of_measure=(unit_of_measure := item.get("unitOfMeasure", "")),
+                monthly_cost=retail_price * monthly_hours if "Hour" in unit_of_measure else retail_price,
+                currency=item.get("currencyCode", "USD")
+            )
+            for item in items
+        ]
         
         # Sort by monthly cost in descending order
-        products_costs.sort(key=lambda x: x["monthly_cost"], reverse=True)
+        products_costs.sort(key=attrgetter("monthly_cost"), reverse=True)
+        total_monthly_cost = math.fsum(cost.monthly_cost for cost in products_costs)
         
         return {
             "product_name": product_name,
             "region": region,
             "monthly_hours": monthly_hours,
-            "products": products_costs,
+            "products": msgspec.to_builtins(products_costs),
             "total_monthly_cost": total_monthly_cost,
             "currency": items[0].get("currencyCode", "USD") if items else "USD",
             "count": len(products_costs),
             "status": "success"
         }
         
-    except requests.exceptions.RequestException as e:
-        log(f"Error connecting to Azure API: {str(e)}", "error")
+    except httpx.HTTPError as e:
+        logger.error(f"Error connecting to Azure API: {str(e)}")
         return {
             "product_name": product_name,
             "region": region,
@@ -513,16 +614,53 @@ class ToolsEndpoint(HTTPEndpoint):
     
     This endpoint returns information about all registered tools
     in the MCP, including their names, descriptions, and expected parameters.
+    The response carries an ETag so clients can revalidate it with If-None-Match.
     """
     async def get(self, request):
-        tools = mcp.list_tools()
-        return JSONResponse(tools)
+        body = await get_tools_json()
+        headers = {
+            "ETag": tools_etag,
+            "Cache-Control": f"public, max-age={settings.CACHE_TTL_SECONDS}"
+        }
+        
+        # Clients that already have this version of the tool list get an empty 304
+        # (If-None-Match uses weak comparison, so a W/ prefix added by a proxy still matches)
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match.strip() == "*" or tools_etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+# JSON body of the tools endpoint and its ETag, built once because the registered tools do not change
+tools_json: Optional[bytes] = None
+tools_etag: Optional[str] = None
+
+async def get_tools_json() -> bytes:
+    """Return the serialized list of registered tools, building it (and its ETag) on first use."""
+    global tools_json, tools_etag
+    if tools_json is None:
+        tools = await mcp.list_tools()
+        tools_json = orjson.dumps([tool.model_dump(mode="json") for tool in tools])
+        tools_etag = f'"{hashlib.blake2b(tools_json, digest_size=8).hexdigest()}"'
+    return tools_json
+
+@asynccontextmanager
+async def lifespan(app):
+    """Open the shared HTTP client and serialize the tool list on startup, close the client on shutdown."""
+    global http_client
+    http_client = create_http_client()
+    await get_tools_json()
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        http_client = None
 
 # Create the Starlette application with routes
+# (/tools goes first, the catch-all mount of the SSE app would otherwise shadow it)
 app = Starlette(routes=[
-    Mount("/", app=mcp.sse_app()),
-    Route("/tools", ToolsEndpoint)
-])
+    Route("/tools", ToolsEndpoint),
+    Mount("/", app=mcp.sse_app())
+], lifespan=lifespan)
 
 # Create the FastAPI application with Model Context Protocol
 def get_application():
@@ -530,11 +668,11 @@ def get_application():
     return app
 
 if __name__ == "__main__":
-    log(f"Starting MCP server at http://{settings.MCP_HOST}:{settings.MCP_PORT}")
-    log(f"SSE Endpoint: http://{settings.MCP_HOST}:{settings.MCP_PORT}/sse")
-    log(f"Tools Endpoint: http://{settings.MCP_HOST}:{settings.MCP_PORT}/tools")
-    log(f"Debug mode: {'ON' if settings.MCP_DEBUG else 'OFF'}")
-    log(f"Auto-reload: {'ENABLED' if settings.MCP_RELOAD else 'DISABLED'}")
+    logger.info(f"Starting MCP server at http://{settings.MCP_HOST}:{settings.MCP_PORT}")
+    logger.info(f"SSE Endpoint: http://{settings.MCP_HOST}:{settings.MCP_PORT}/sse")
+    logger.info(f"Tools Endpoint: http://{settings.MCP_HOST}:{settings.MCP_PORT}/tools")
+    logger.info(f"Debug mode: {'ON' if settings.MCP_DEBUG else 'OFF'}")
+    logger.info(f"Auto-reload: {'ENABLED' if settings.MCP_RELOAD else 'DISABLED'}")
     
     # Configure uvicorn
     uvicorn_config = {
@@ -542,9 +680,20 @@ if __name__ == "__main__":
         "host": settings.MCP_HOST,
         "port": settings.MCP_PORT,
         "reload": settings.MCP_RELOAD,
+        # Faster event loop and HTTP parser from uvicorn[standard] (uvloop does not support Windows)
+        "loop": "asyncio" if sys.platform == "win32" else "uvloop",
+        "http": "httptools",
         "log_level": "debug" if settings.MCP_DEBUG else settings.LOG_LEVEL.lower()
     }
     
+    # A single worker by default: SSE sessions live in the memory of the process that opened
+    # GET /sse, so POST /messages/ only works if it reaches that same process. More workers
+    # need sticky routing by session_id in front of the server. Uvicorn does not allow
+    # workers together with reload; each worker has its own HTTP client and response cache.
+    if not settings.MCP_RELOAD and settings.MCP_WORKERS > 1:
+        uvicorn_config["workers"] = settings.MCP_WORKERS
+        logger.warning(f"Running {settings.MCP_WORKERS} workers: requests for an SSE session must be routed to the worker that holds it")
+    
     logger.debug(f"Uvicorn configuration: {uvicorn_config}")
     
     if settings.MCP_DEBUG:
@@ -4,24 +4,33 @@ Configuración del servidor MCP de Azure Pricing.
 Este archivo puede ser sobreescrito mediante variables de entorno con prefijo MCP_
 """
 from typing import List, Optional, Union
-from pydantic import Field, field_validator, HttpUrl, validator
+from pydantic import AliasChoices, Field, field_validator, HttpUrl, validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
+import re
 
 # Valores por defecto
 DEFAULT_HOST = '0.0.0.0'
 DEFAULT_PORT = 8080
 DEFAULT_LOG_LEVEL = 'INFO'
+DEFAULT_API_VERSION = '2023-01-01-preview'
+
+# Formato de versión de la API (ej: 2023-01-01 o 2023-01-01-preview)
+API_VERSION_RE = re.compile(r'^\d{4}-\d{2}-\d{2}(-preview)?$')
 
 class Settings(BaseSettings):
     # Configuración del servidor
+    # (los campos MCP_* se leen de MCP_HOST, MCP_PORT...; también se acepta el nombre con
+    # el prefijo duplicado, MCP_MCP_HOST, que es el que resultaría de aplicar env_prefix)
     MCP_HOST: str = Field(
         default=DEFAULT_HOST,
+        validation_alias=AliasChoices('MCP_HOST', 'MCP_MCP_HOST'),
         description='Dirección IP para escuchar (ej: 0.0.0.0 para todas las interfaces)'
     )
     
     MCP_PORT: int = Field(
         default=DEFAULT_PORT,
+        validation_alias=AliasChoices('MCP_PORT', 'MCP_MCP_PORT'),
         description='Puerto para el servidor',
         gt=0,
         lt=65536
@@ -29,14 +38,23 @@ class Settings(BaseSettings):
     
     MCP_DEBUG: bool = Field(
         default=True,
+        validation_alias=AliasChoices('MCP_DEBUG', 'MCP_MCP_DEBUG'),
         description='Habilita el modo debug (no usar en producción)'
     )
     
     MCP_RELOAD: bool = Field(
         default=False,
+        validation_alias=AliasChoices('MCP_RELOAD', 'MCP_MCP_RELOAD'),
         description='Habilita la recarga automática en desarrollo'
     )
     
+    MCP_WORKERS: int = Field(
+        default=1,
+        validation_alias=AliasChoices('MCP_WORKERS', 'MCP_MCP_WORKERS'),
+        description='Número de procesos worker de uvicorn (más de uno solo con sesiones persistentes en el balanceador; se ignora con MCP_RELOAD)',
+        gt=0
+    )
+    
     # Configuración de CORS
     CORS_ORIGINS: Union[str, List[str]] = Field(
         default='*',
@@ -56,10 +74,23 @@ class Settings(BaseSettings):
     )
     
     AZURE_API_VERSION: str = Field(
-        default='2023-01-01-preview',
+        default=DEFAULT_API_VERSION,
         description='Versión de la API de precios de Azure'
     )
     
+    # Configuración de la caché de respuestas
+    CACHE_TTL_SECONDS: int = Field(
+        default=300,
+        description='Segundos que se conservan en caché las respuestas de la API de precios',
+        gt=0
+    )
+    
+    CACHE_MAX_ENTRIES: int = Field(
+        default=512,
+        description='Número máximo de respuestas guardadas en caché',
+        gt=0
+    )
+    
     # Configuración de cálculos
     HOURS_IN_MONTH: int = Field(
         default=730,  # 24 horas * 365 días / 12 meses ≈ 730
@@ -88,7 +119,8 @@ class Settings(BaseSettings):
         case_sensitive=False,
         extra='ignore',
         validate_default=True,
-        env_nested_delimiter='__'
+        env_nested_delimiter='__',
+        frozen=True
     )
     
     # Validadores
@@ -123,17 +155,10 @@ class Settings(BaseSettings):
     
     @field_validator('AZURE_API_VERSION')
     def validate_api_version(cls, v):
-        if not v:
-            return '2023-01-01-preview'
         v = str(v).strip()
-        # Validar formato de versión (ej: 2023-01-01-preview)
-        try:
-            parts = v.split('-')
-            if not all(part.isdigit() for part in parts[0].split('.')):
-                raise ValueError()
-        except (ValueError, AttributeError):
-            # Si el formato no es válido, usar el valor por defecto
-            return '2023-01-01-preview'
+        # Si el formato no es válido, usar el valor por defecto
+        if not API_VERSION_RE.match(v):
+            return DEFAULT_API_VERSION
         return v
     
     @field_validator('PRICE_TYPE')
@@ -143,14 +168,11 @@ class Settings(BaseSettings):
         return str(v).strip()
     
     @field_validator('MCP_DEBUG', 'MCP_RELOAD', mode='before')
-    def validate_bool(cls, v):
-        if isinstance(v, str):
-            v = v.lower()
-            if v in ('true', '1', 'yes'):
-                return True
-            if v in ('false', '0', 'no', ''):
-                return False
-        return bool(v)
+    def empty_bool_is_false(cls, v):
+        # Una variable vacía equivale a false; el resto lo convierte pydantic ('true', '0', 'yes'...)
+        if isinstance(v, str) and not v.strip():
+            return False
+        return v
 
 # Cargar configuración
 try:
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Kernel compilado con Numba para calcular el coste mensual de muchas variantes a la vez.
+
+Solo compensa con lotes grandes (unos cientos de filas); para pocas filas basta con NumPy.
+Se compila en la primera llamada y, con cache=True, el resultado se guarda en disco para
+las siguientes ejecuciones.
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, fastmath=True)
+def monthly_costs(prices, is_hourly, monthly_hours):
+    """
+    Calcula el coste mensual de cada variante.
+    
+    Args:
+        prices: Array float64 con el precio por unidad de cada variante
+        is_hourly: Array booleano que indica si cada precio es por horas
+        monthly_hours: Número de horas al mes
+    """
+    out = np.empty_like(prices)
+    for i in range(prices.shape[0]):
+        out[i] = prices[i] * monthly_hours if is_hourly[i] else prices[i]
+    return out
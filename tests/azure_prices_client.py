@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Cliente HTTP compartido por los scripts de prueba de la API de Azure Retail Prices.
+
+Todos los scripts importan de aquí la sesión, de modo que en un mismo proceso comparten
+el pool de conexiones, la caché SQLite, los reintentos y el parseo con orjson/ijson.
+"""
+import asyncio
+import httpx
+import ijson
+import orjson
+import requests
+import requests_cache
+from datetime import timedelta
+from types import MappingProxyType
+from urllib.parse import quote_plus, urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+try:
+    import uvloop
+except ImportError:  # uvloop no está instalado (o es Windows): se usa el bucle de asyncio
+    uvloop = None
+
+# Configuración de la API
+AZURE_PRICE_API = "https://prices.azure.com/api/retail/prices"
+API_VERSION = "2023-01-01-preview"
+
+# Campos que se usan de cada item: el resto no se descarga ni se parsea
+SELECT_FIELDS = "productName,serviceName,skuName,armRegionName,retailPrice,currencyCode,unitOfMeasure,meterName,type"
+
+# Parámetros comunes a todas las consultas (solo lectura)
+BASE_PARAMS = MappingProxyType({'api-version': API_VERSION, '$select': SELECT_FIELDS})
+
+# Timeout de conexión y de lectura
+TIMEOUT = (3.05, 30)
+
+# Reintentos ante errores transitorios (los mismos en la sesión síncrona y en el cliente async)
+MAX_RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# Retry-After máximo (segundos) que se espera; si la API pide más, se devuelve el error
+MAX_RETRY_DELAY = 10.0
+
+# Sesión HTTP compartida: reutiliza la conexión TLS con prices.azure.com entre llamadas
+# y guarda las respuestas en una caché SQLite durante 6 horas (los precios cambian poco)
+SESSION = requests_cache.CachedSession(
+    'azure_prices_cache',
+    backend='sqlite',
+    expire_after=timedelta(hours=6),
+    allowable_methods=('GET',),
+    cache_control=True
+)
+
+# Sesión sin caché para las consultas grandes que se parsean en streaming: la caché leería
+# el cuerpo entero para guardarlo antes de devolver la respuesta
+STREAM_SESSION = requests.Session()
+
+for _session in (SESSION, STREAM_SESSION):
+    _session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=MAX_RETRIES, backoff_factor=RETRY_BACKOFF_FACTOR, status_forcelist=sorted(RETRY_STATUS_CODES))
+    ))
+    _session.headers.update({
+        # gzip y deflate, más br solo si el paquete brotli está instalado (urllib3 no podría descomprimirlo)
+        **make_headers(accept_encoding=True),
+        "Connection": "keep-alive",
+        "Accept": "application/json"
+    })
+
+
+def _check_status(response):
+    """
+    Lanza requests.HTTPError si la respuesta es un error.
+    
+    Solo mira status_code: a diferencia de raise_for_status no decodifica el motivo ni el cuerpo.
+    """
+    if response.status_code >= 400:
+        raise requests.HTTPError(f"{response.status_code} {response.reason} para {response.url}", response=response)
+
+
+def odata_literal(value):
+    """
+    Devuelve un valor como literal de texto OData, entre comillas simples.
+    
+    Las comillas simples del valor se duplican, como exige OData, de modo que nombres
+    como "Men's Product" no rompen el filtro.
+    """
+    return "'" + value.replace("'", "''") + "'"
+
+
+def build_query(filter_params, **extra):
+    """
+    Codifica la query string de una consulta.
+    
+    Los parámetros extra se pasan con su nombre en la API, p. ej. **{'$top': 10}.
+    $filter va al final, de modo que se pueden añadir más condiciones codificadas detrás.
+    """
+    params = {**BASE_PARAMS, **extra, '$filter': filter_params}
+    return urlencode(params, quote_via=quote_plus)
+
+
+def fetch_query(query):
+    """
+    Hace una petición con una query string ya codificada y devuelve la respuesta parseada.
+    
+    Lanza requests.exceptions.RequestException si la petición falla.
+    """
+    response = SESSION.get(f"{AZURE_PRICE_API}?{query}", timeout=TIMEOUT)
+    _check_status(response)
+    return orjson.loads(response.content)
+
+
+def fetch(filter_params, **extra):
+    """
+    Hace una petición con el filtro OData indicado y devuelve la respuesta parseada (una página).
+    
+    Lanza requests.exceptions.RequestException si la petición falla.
+    """
+    return fetch_query(build_query(filter_params, **extra))
+
+
+def _parse_events(raw, next_page):
+    """Parsea una página en streaming y guarda su NextPageLink (va después de Items) en next_page."""
+    for prefix, event, value in ijson.parse(raw, use_float=True):
+        if prefix == "NextPageLink" and value:
+            next_page.append(value)
+        yield prefix, event, value
+
+
+def iter_all_items(filter_params, stream=False, **extra):
+    """
+    Devuelve uno a uno todos los items que cumplen el filtro, siguiendo NextPageLink
+    si la respuesta tiene varias páginas.
+    
+    Por defecto cada página se descarga con la sesión con caché y se parsea entera con orjson.
+    Con stream=True se usa la sesión sin caché y cada página se parsea con ijson a medida
+    que llega del socket, de modo que nunca está entera en memoria: útil para filtros que
+    devuelven muchísimos items. Lanza requests.exceptions.RequestException si la petición falla.
+    """
+    url = f"{AZURE_PRICE_API}?{build_query(filter_params, **extra)}"
+    while url:
+        if stream:
+            # La respuesta se lee del socket mientras se parsea (NextPageLink va después de Items)
+            next_page = []
+            with STREAM_SESSION.get(url, timeout=TIMEOUT, stream=True) as response:
+                _check_status(response)
+                response.raw.decode_content = True  # descomprimir gzip/br al leer
+                yield from ijson.items(_parse_events(response.raw, next_page), "Items.item")
+            url = next_page[0] if next_page else None
+        else:
+            response = SESSION.get(url, timeout=TIMEOUT)
+            _check_status(response)
+            result = orjson.loads(response.content)
+            yield from result.get("Items", [])
+            url = result.get("NextPageLink")
+
+
+async def _aget(client, url):
+    """
+    GET asíncrono que reintenta los errores transitorios (429, 5xx) con backoff exponencial,
+    respetando la cabecera Retry-After, igual que el adaptador de la sesión síncrona.
+    
+    Lanza httpx.HTTPError si la petición falla.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        response = await client.get(url)
+        if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+            break
+        
+        retry_after = response.headers.get("Retry-After", "")
+        delay = float(retry_after) if retry_after.isdigit() else RETRY_BACKOFF_FACTOR * (2 ** attempt)
+        if delay > MAX_RETRY_DELAY:
+            break
+        await asyncio.sleep(delay)
+    
+    response.raise_for_status()
+    return response
+
+
+async def afetch_all_items(client, filter_params, **extra):
+    """
+    Versión asíncrona de iter_all_items usando un cliente httpx compartido.
+    
+    Reintenta los errores transitorios como la versión síncrona, pero no usa la caché SQLite:
+    cada llamada va siempre a la API. Devuelve la lista con todos los items.
+    Lanza httpx.HTTPError si la petición falla.
+    """
+    result = orjson.loads((await _aget(client, f"{AZURE_PRICE_API}?{build_query(filter_params, **extra)}")).content)
+    items = result.get("Items", [])
+    
+    # Obtener el resto de páginas
+    while result.get("NextPageLink"):
+        result = orjson.loads((await _aget(client, result["NextPageLink"])).content)
+        items.extend(result.get("Items", []))
+    
+    return items
+
+
+async def fetch_all_async(filters, **extra):
+    """
+    Lanza todas las consultas a la vez, multiplexadas sobre una única conexión HTTP/2.
+    
+    Devuelve una lista con los items de cada filtro, en el mismo orden; si una consulta
+    falla, en su posición va la excepción.
+    """
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+    # Los fallos de conexión se reintentan en el transporte; los 429/5xx, en _aget
+    transport = httpx.AsyncHTTPTransport(http2=True, limits=limits, retries=MAX_RETRIES)
+    async with httpx.AsyncClient(transport=transport, headers={"Accept": "application/json"}, timeout=30) as client:
+        return await asyncio.gather(*(afetch_all_items(client, f, **extra) for f in filters), return_exceptions=True)
+
+
+def run(coro):
+    """
+    Ejecuta una corrutina desde un script.
+    
+    Usa uvloop si está instalado (viene con uvicorn[standard]): arranca y hace la E/S
+    más rápido que el bucle por defecto de asyncio.
+    """
+    if uvloop is None:
+        return asyncio.run(coro)
+    return uvloop.run(coro)
@@ -1,53 +1,143 @@
 #!/usr/bin/env python3
+import functools
+import itertools
 import requests
-import json
 import sys
+from urllib.parse import quote_plus
 
-def test_api_call(service_family, region="westeurope", type="", service_name=""):
+from azure_prices_client import build_query, fetch_query, iter_all_items, odata_literal
+
+# Resultados que se piden por cada combinación de región y servicio
+ITEMS_PER_COMBINATION = 10
+
+# Máximo de $top que admite la API
+MAX_TOP = 1000
+
+def _as_tuple(values):
+    """Normaliza un valor o una lista de valores a una tupla, descartando los vacíos."""
+    if not values:
+        return ()
+    if isinstance(values, str):
+        return (values,)
+    return tuple(value for value in values if value)
+
+def _field_filter(field, values):
     """
-    Prueba directa de la API de Azure Retail Prices con los parámetros especificados.
+    Construye la condición OData para un campo: 'eq' con un solo valor
+    e 'in (...)' con varios, de modo que todas las combinaciones van en una sola petición.
     """
-    print(f"Consultando API para familia: {service_family}, región: {region}, tipo: {type}, servicio: {service_name}")
+    if len(values) == 1:
+        return f"{field} eq {odata_literal(values[0])}"
+    quoted = ", ".join(odata_literal(value) for value in values)
+    return f"{field} in ({quoted})"
+
+@functools.lru_cache(maxsize=256)
+def _build_query(service_family, type_, service_names, top=10):
+    """
+    Construye la consulta para una familia, tipo y servicios, sin la región.
     
-    # Configuración de la API
-    AZURE_PRICE_API = "https://prices.azure.com/api/retail/prices"
-    API_VERSION = "2023-01-01-preview"
+    Devuelve el filtro y la query string ya codificada. $filter va al final, de modo que
+    para consultar una o varias regiones basta con añadir su condición codificada.
+    """
+    filter_params = f"serviceFamily eq {odata_literal(service_family)}"
+    if type_:
+        filter_params += f" and type eq {odata_literal(type_)}"
+    if service_names:
+        filter_params += f" and {_field_filter('serviceName', service_names)}"
     
-    # Construir los parámetros de la consulta
-    filter_params = f"serviceFamily eq '{service_family}'"
-    if region:
-        filter_params += f" and armRegionName eq '{region}'"
-    if type:
-        filter_params += f" and type eq '{type}'"
-    if service_name:
-        filter_params += f" and serviceName eq '{service_name}'"
+    return filter_params, build_query(filter_params, **{'$top': top})
+
+def _format_items(items):
+    """Devuelve las líneas a mostrar para los primeros 3 items."""
+    lines = []
+    for i, item in enumerate(items[:3]):
+        lines.append(f"\nProducto {i+1}:\n")
+        lines.append(f"  Nombre: {item.get('productName', 'N/A')}\n")
+        lines.append(f"  Servicio: {item.get('serviceName', 'N/A')}\n")
+        lines.append(f"  SKU: {item.get('skuName', 'N/A')}\n")
+        lines.append(f"  Región: {item.get('armRegionName', 'N/A')}\n")
+        lines.append(f"  Precio: {item.get('retailPrice', 'N/A')} {item.get('currencyCode', '')}\n")
+    return lines
+
+def _fetch_combined(filter_params, regions, service_names):
+    """
+    Obtiene hasta ITEMS_PER_COMBINATION items por cada combinación de región y servicio
+    de una consulta con 'in (...)'.
     
-    params = {
-        'api-version': API_VERSION,
-        '$filter': filter_params,
-        '$top': 10  # Limitamos a 10 resultados para la prueba
-    }
+    La API decide qué combinaciones llenan cada página, así que se sigue NextPageLink
+    hasta tener suficientes items de todas (o hasta que no hay más páginas) y el resto
+    se descarta en local.
+    """
+    combinations = max(len(regions), 1) * max(len(service_names), 1)
+    top = min(ITEMS_PER_COMBINATION * combinations, MAX_TOP)
+    
+    # Solo se distingue por los campos que tienen varios valores en el filtro
+    def combination(item):
+        return (item.get('armRegionName') if regions else None,
+                item.get('serviceName') if service_names else None)
+    
+    counts = {}
+    full = 0
+    items = []
+    for item in iter_all_items(filter_params, **{'$top': top}):
+        key = combination(item)
+        count = counts.get(key, 0)
+        if count >= ITEMS_PER_COMBINATION:
+            continue
+        counts[key] = count + 1
+        items.append(item)
+        if count + 1 == ITEMS_PER_COMBINATION:
+            full += 1
+            if full == combinations:
+                break
+    return items
+
+def test_api_call(service_family, region="westeurope", type="", service_name=""):
+    """
+    Prueba directa de la API de Azure Retail Prices con los parámetros especificados.
+    
+    region y service_name aceptan un valor o una lista de valores. Con varios valores se hace
+    una única consulta con 'in (...)', se leen las páginas necesarias para tener hasta
+    ITEMS_PER_COMBINATION resultados de cada combinación y se muestran agrupados por región y servicio.
+    """
+    regions = _as_tuple(region)
+    service_names = _as_tuple(service_name)
+    print(f"Consultando API para familia: {service_family}, región: {', '.join(regions)}, tipo: {type}, servicio: {', '.join(service_names)}")
+    
+    # Construir los parámetros de la consulta: la parte común se reutiliza entre regiones
+    combined = len(regions) > 1 or len(service_names) > 1
+    filter_params, query = _build_query(service_family, type, service_names, ITEMS_PER_COMBINATION)
+    if regions:
+        region_filter = f" and {_field_filter('armRegionName', regions)}"
+        filter_params += region_filter
+        query += quote_plus(region_filter)
     
     print(f"Filtro: {filter_params}")
     
     try:
         # Realizar la petición a la API
-        response = requests.get(AZURE_PRICE_API, params=params)
-        response.raise_for_status()
-        result = response.json()
+        if combined:
+            items = _fetch_combined(filter_params, regions, service_names)
+            result = {"Items": items, "Count": len(items)}
+        else:
+            result = fetch_query(query)
+            items = result.get("Items", [])
         
         # Mostrar información sobre los resultados
-        items = result.get("Items", [])
         print(f"Se encontraron {len(items)} productos")
         
-        # Mostrar los primeros 3 resultados
-        for i, item in enumerate(items[:3]):
-            print(f"\nProducto {i+1}:")
-            print(f"  Nombre: {item.get('productName', 'N/A')}")
-            print(f"  Servicio: {item.get('serviceName', 'N/A')}")
-            print(f"  SKU: {item.get('skuName', 'N/A')}")
-            print(f"  Región: {item.get('armRegionName', 'N/A')}")
-            print(f"  Precio: {item.get('retailPrice', 'N/A')} {item.get('currencyCode', '')}")
+        # Mostrar los primeros 3 resultados (se escriben de una vez al final)
+        if combined:
+            # Consulta combinada: separar los resultados por región y servicio
+            group_key = lambda item: (item.get('armRegionName', 'N/A'), item.get('serviceName', 'N/A'))
+            items = sorted(items, key=group_key)
+            lines = []
+            for (item_region, item_service), group in itertools.groupby(items, key=group_key):
+                lines.append(f"\n=== {item_region} / {item_service} ===\n")
+                lines.extend(_format_items(list(group)))
+        else:
+            lines = _format_items(items)
+        sys.stdout.write("".join(lines))
         
         return result
     
@@ -57,10 +147,14 @@ def test_api_call(service_family, region="westeurope", type="", service_name="")
 
 if __name__ == "__main__":
     # Procesar argumentos de línea de comandos
+    # (se pueden indicar varias regiones o servicios separados por ';')
     service_family = sys.argv[1] if len(sys.argv) > 1 else "Networking"
     region = sys.argv[2] if len(sys.argv) > 2 else "westeurope"
     service_name = sys.argv[3] if len(sys.argv) > 3 else "Virtual Network"
     type_param = sys.argv[4] if len(sys.argv) > 4 else ""
     
+    regions = [value.strip() for value in region.split(";") if value.strip()]
+    service_names = [value.strip() for value in service_name.split(";") if value.strip()]
+    
     # Llamar a la función de prueba
-    test_api_call(service_family, region, type_param, service_name)
+    test_api_call(service_family, regions, type_param, service_names)
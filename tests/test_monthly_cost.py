@@ -1,8 +1,172 @@
 #!/usr/bin/env python3
+import functools
+import httpx
+import math
+import numpy as np
 import requests
-import json
+import sys
+from operator import itemgetter
 
-def calculate_monthly_cost(product_name, region="westeurope", monthly_hours=730, type="Consumption"):
+from azure_prices_client import fetch_all_async, iter_all_items, odata_literal, run
+
+# A partir de este número de variantes compensa usar el kernel compilado con Numba
+_KERNEL_MIN_ROWS = 200
+
+# Unidades de medida horarias más habituales en la API de precios
+_HOURLY_UNITS = frozenset({"1 Hour", "1/Hour", "10 Hours", "100 Hours", "1000 Hours"})
+
+# Plantilla con la información de cada variante (se formatea con % dentro del bucle)
+_ROW_TMPL = (
+    "\nVariante %d:\n"
+    "  SKU: %s\n"
+    "  Meter: %s\n"
+    "  Precio por unidad: %s %s por %s\n"
+    "  Coste mensual estimado: %.2f %s\n"
+)
+
+@functools.lru_cache(maxsize=None)
+def _load_kernel():
+    """
+    Importa el kernel de Numba la primera vez que hace falta, o devuelve None si Numba
+    no está instalado. Importarlo y compilarlo cuesta cientos de ms, así que no se hace
+    al arrancar el script sino solo con lotes de más de _KERNEL_MIN_ROWS variantes.
+    """
+    try:
+        from _cost_kernel import monthly_costs
+    except ImportError:  # Numba no está instalado: se calcula solo con NumPy
+        return None
+    return monthly_costs
+
+def _is_hourly(unit_of_measure):
+    """Indica si el precio de una unidad de medida es por horas."""
+    return unit_of_measure in _HOURLY_UNITS or "Hour" in unit_of_measure
+
+
+def _build_filter(product_name, region="westeurope", type="Consumption"):
+    """Construye el filtro OData de la consulta para un producto."""
+    filter_params = f"productName eq {odata_literal(product_name)} and armRegionName eq {odata_literal(region)}"
+    if type:
+        filter_params += f" and type eq {odata_literal(type)}"
+    
+    return filter_params
+
+
+def _fetch(product_name, region="westeurope", type="Consumption", filter_type_clientside=False, stream=False):
+    """
+    Consulta la API de Azure Retail Prices para un producto y devuelve un iterador con sus items.
+    
+    Con stream=True las respuestas no pasan por la caché y se parsean en streaming a medida
+    que llegan, de modo que la memoria no depende del tamaño de cada página.
+    
+    Con filter_type_clientside=True el tipo no se incluye en el filtro OData y los items
+    se filtran aquí: para productos con pocas variantes la consulta es más barata.
+    
+    Lanza requests.exceptions.RequestException al recorrerlo si la petición falla.
+    """
+    filter_params = _build_filter(product_name, region, None if filter_type_clientside else type)
+    
+    print(f"Consultando API para: {product_name} en {region}")
+    print(f"Filtro: {filter_params}")
+    
+    items = iter_all_items(filter_params, stream=stream)
+    if filter_type_clientside and type:
+        items = (item for item in items if item.get("type") == type)
+    return items
+
+
+def _summarize(product_name, items, monthly_hours=730):
+    """
+    Muestra el coste mensual de cada variante de un producto y el total.
+    
+    Args:
+        product_name: Nombre del producto consultado
+        items: Items devueltos por la API (lista o iterador)
+        monthly_hours: Número de horas al mes
+    """
+    # Extrae todos los campos de un item en una sola llamada
+    get_fields = itemgetter("skuName", "meterName", "retailPrice", "currencyCode", "unitOfMeasure")
+    
+    # Solo se guardan los campos necesarios de cada item, no el item completo
+    rows = []
+    for item in items:
+        try:
+            rows.append(get_fields(item))
+        except KeyError:
+            # Al item le falta algún campo: usar valores por defecto
+            rows.append((
+                item.get("skuName", ""),
+                item.get("meterName", ""),
+                item.get("retailPrice", 0),
+                item.get("currencyCode", "USD"),
+                item.get("unitOfMeasure", "")
+            ))
+    
+    if len(rows) == 0:
+        print(f"No se encontraron productos para: {product_name}")
+        return
+    
+    print(f"Se encontraron {len(rows)} variantes del producto.")
+    
+    # Calcular el coste mensual de todas las variantes a la vez
+    prices = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+    units = np.array([row[4] for row in rows])
+    
+    # Solo hay unas pocas unidades distintas: se clasifica cada una una vez y se expande al array
+    unique_units, unit_index = np.unique(units, return_inverse=True)
+    is_hourly = np.array([_is_hourly(unit) for unit in unique_units.tolist()], dtype=bool)[unit_index]
+    kernel = _load_kernel() if len(rows) > _KERNEL_MIN_ROWS else None
+    if kernel is not None:
+        costs = kernel(prices, is_hourly, monthly_hours)
+    else:
+        costs = np.where(is_hourly, prices * monthly_hours, prices)
+    costs = costs.tolist()
+    
+    # Suma con compensación de errores: exacta aunque haya miles de precios pequeños
+    total_monthly_cost = math.fsum(costs)
+    
+    # Mostrar información para cada variante (se escribe todo de una vez al final)
+    lines = []
+    for i, ((sku_name, meter_name, retail_price, currency, unit_of_measure), monthly_cost) in enumerate(zip(rows, costs)):
+        lines.append(_ROW_TMPL % (i + 1, sku_name, meter_name, retail_price, currency, unit_of_measure, monthly_cost, currency))
+    
+    lines.append(f"\nCoste mensual total estimado: {total_monthly_cost:.2f} {currency}\n")
+    sys.stdout.write("".join(lines))
+
+
+def _summarize_stream(product_name, items, monthly_hours=730):
+    """
+    Versión de _summarize para respuestas parseadas en streaming.
+    
+    Calcula el coste de cada variante y escribe su información según llegan los items,
+    sin guardarlos: la memoria no depende del número de variantes. El total se acumula
+    con math.fsum sobre un generador y el número de variantes se muestra al final.
+    """
+    count = 0
+    currency = "USD"
+    
+    def monthly_costs():
+        nonlocal count, currency
+        for item in items:
+            retail_price = item.get("retailPrice", 0)
+            currency = item.get("currencyCode", "USD")
+            unit_of_measure = item.get("unitOfMeasure", "")
+            monthly_cost = retail_price * monthly_hours if _is_hourly(unit_of_measure) else retail_price
+            count += 1
+            sys.stdout.write(_ROW_TMPL % (count, item.get("skuName", ""), item.get("meterName", ""), retail_price,
+                                          currency, unit_of_measure, monthly_cost, currency))
+            yield monthly_cost
+    
+    total_monthly_cost = math.fsum(monthly_costs())
+    
+    if count == 0:
+        print(f"No se encontraron productos para: {product_name}")
+        return
+    
+    print(f"\nSe encontraron {count} variantes del producto.")
+    print(f"Coste mensual total estimado: {total_monthly_cost:.2f} {currency}")
+
+
+def calculate_monthly_cost(product_name, region="westeurope", monthly_hours=730, type="Consumption", filter_type_clientside=False, stream=False):
     """
     Calcula el coste mensual de un producto específico de Azure.
     
@@ -11,66 +175,64 @@ def calculate_monthly_cost(product_name, region="westeurope", monthly_hours=730,
         region: Región de Azure
         monthly_hours: Número de horas al mes (por defecto 730)
         type: Tipo de precio
+        filter_type_clientside: Filtrar por tipo en local en vez de en la API
+        stream: Parsear las respuestas en streaming y mostrar cada variante según llega, sin caché
+            (para productos con muchísimas variantes: la memoria no depende de su número)
+    """
+    summarize = _summarize_stream if stream else _summarize
+    try:
+        summarize(product_name, _fetch(product_name, region, type, filter_type_clientside, stream), monthly_hours)
+    except requests.exceptions.RequestException as e:
+        print(f"Error al conectar con la API: {str(e)}")
+
+
+def calculate_monthly_costs(product_names, region="westeurope", monthly_hours=730, type="Consumption", filter_type_clientside=False):
     """
-    # Configuración de la API
-    AZURE_PRICE_API = "https://prices.azure.com/api/retail/prices"
-    API_VERSION = "2023-01-01-preview"
+    Calcula el coste mensual de varios productos de Azure.
     
-    # Construir la consulta
-    filter_params = f"productName eq '{product_name}' and armRegionName eq '{region}'"
-    if type:
-        filter_params += f" and type eq '{type}'"
+    Las consultas se lanzan a la vez sobre una única conexión HTTP/2, de modo que
+    N productos tardan aproximadamente lo que la consulta más lenta. Los errores
+    transitorios se reintentan, pero a diferencia de calculate_monthly_cost las
+    respuestas no se guardan en la caché SQLite.
     
-    params = {
-        'api-version': API_VERSION,
-        '$filter': filter_params
-    }
+    Args:
+        product_names: Lista con los nombres exactos de los productos
+        region: Región de Azure
+        monthly_hours: Número de horas al mes (por defecto 730)
+        type: Tipo de precio
+        filter_type_clientside: Filtrar por tipo en local en vez de en la API
+    """
+    if not product_names:
+        return
     
-    print(f"Consultando API para: {product_name} en {region}")
-    print(f"Filtro: {filter_params}")
+    server_type = None if filter_type_clientside else type
+    filters = [_build_filter(name, region, server_type) for name in product_names]
+    for product_name, filter_params in zip(product_names, filters):
+        print(f"Consultando API para: {product_name} en {region}")
+        print(f"Filtro: {filter_params}")
     
-    try:
-        # Realizar la petición a la API
-        response = requests.get(AZURE_PRICE_API, params=params)
-        response.raise_for_status()
-        result = response.json()
-        
-        # Extraer los items relevantes
-        items = result.get("Items", [])
-        
-        if len(items) == 0:
-            print(f"No se encontraron productos para: {product_name}")
-            return
-        
-        print(f"Se encontraron {len(items)} variantes del producto.")
-        total_monthly_cost = 0
-        
-        # Mostrar información para cada variante
-        for i, item in enumerate(items):
-            sku_name = item.get("skuName", "")
-            meter_name = item.get("meterName", "")
-            retail_price = item.get("retailPrice", 0)
-            currency = item.get("currencyCode", "USD")
-            unit_of_measure = item.get("unitOfMeasure", "")
-            
-            # Calcular coste mensual
-            monthly_cost = retail_price * monthly_hours if "Hour" in unit_of_measure else retail_price
-            total_monthly_cost += monthly_cost
-            
-            print(f"\nVariante {i+1}:")
-            print(f"  SKU: {sku_name}")
-            print(f"  Meter: {meter_name}")
-            print(f"  Precio por unidad: {retail_price} {currency} por {unit_of_measure}")
-            print(f"  Coste mensual estimado: {monthly_cost:.2f} {currency}")
+    results = run(fetch_all_async(filters))
+    
+    # Mostrar los resultados en el orden en que se pidieron
+    for product_name, items in zip(product_names, results):
+        if isinstance(items, httpx.HTTPError):
+            print(f"Error al conectar con la API para {product_name}: {str(items)}")
+            continue
+        if isinstance(items, BaseException):
+            raise items
         
-        print(f"\nCoste mensual total estimado: {total_monthly_cost:.2f} {currency}")
+        if filter_type_clientside and type:
+            items = [item for item in items if item.get("type") == type]
         
-    except requests.exceptions.RequestException as e:
-        print(f"Error al conectar con la API: {str(e)}")
+        print(f"\n=== {product_name} ===")
+        _summarize(product_name, items, monthly_hours)
 
 
 if __name__ == "__main__":
-    import sys
+    # --stream: parsear en streaming y sin caché (para productos con muchísimas variantes)
+    stream = "--stream" in sys.argv
+    if stream:
+        sys.argv.remove("--stream")
     
     # Valores por defecto
     product_name = "Azure App Service Premium v3 Plan"
@@ -79,6 +241,7 @@ if __name__ == "__main__":
     type = "Consumption"
     
     # Procesar argumentos de línea de comandos si se proporcionan
+    # (se pueden indicar varios productos separados por ';')
     if len(sys.argv) > 1:
         product_name = sys.argv[1]
     if len(sys.argv) > 2:
@@ -89,4 +252,12 @@ if __name__ == "__main__":
         type = sys.argv[4]
     
     # Calcular el coste mensual
-    calculate_monthly_cost(product_name, region, monthly_hours, type)
+    product_names = [name.strip() for name in product_name.split(";") if name.strip()]
+    if stream:
+        # En streaming los productos se procesan de uno en uno
+        for name in product_names:
+            calculate_monthly_cost(name, region, monthly_hours, type, stream=True)
+    elif len(product_names) > 1:
+        calculate_monthly_costs(product_names, region, monthly_hours, type)
+    else:
+        calculate_monthly_cost(product_name, region, monthly_hours, type)